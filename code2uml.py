@@ -1,13 +1,171 @@
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Tuple, Dict, Iterable, Callable, FrozenSet
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import ast
 import os
-import re
 
-IMPORTPATTERN1 = r"[\n|^]import ([\w\.]*).*\n"
-IMPORTPATTERN2 = r"from (\w*) import .*\n"
+# below this number of files they are parsed in the main process
+_PARALLEL_MIN_FILES = 8
 
-CLASSPATTERN = r"\n(class [\s\S]*?(?=\n\w|\Z))"
-METHODPATTERN = r"def [\s\S]*?(?=\n\w|\Z)"
-FUNCPATTERN = r"\ndef (\w*)\("
+_CLASS_TEMPLATE = """{name}Class [
+  shape=plain
+  label=<<table border="0" cellborder="1" cellspacing="0" cellpadding="4">
+    <tr> <td> <b>{name}</b> </td> </tr>
+{attributes}{methods}  </table>>]
+
+"""
+_SECTION_TEMPLATE = """    <tr> <td>
+      <table border="0" cellborder="0" cellspacing="0" >
+        <tr> <td align="left" >+ {title}</td> </tr>
+{rows}      </table>
+    </td> </tr>
+"""
+_ROW_TEMPLATE = """        <tr> <td port="ss1" align="left" >- {}</td> </tr>\n"""
+
+
+def _graphviz_class(name: str, attributes: List[str], methods: List[str]) -> str:
+    """
+    Generates a .dot representation for a single class
+    :param name: str = name of the class
+    :param attributes: List[str] = attribute names of the class
+    :param methods: List[str] = method names of the class
+    :return: .dot representation for the class
+    """
+    attributes_block = ""
+    if attributes:
+        rows = "".join(_ROW_TEMPLATE.format(attri) for attri in attributes)
+        attributes_block = _SECTION_TEMPLATE.format(title="property", rows=rows)
+
+    methods_block = ""
+    if methods:
+        rows = "".join(_ROW_TEMPLATE.format(method) for method in methods)
+        methods_block = _SECTION_TEMPLATE.format(title="method", rows=rows)
+
+    return _CLASS_TEMPLATE.format(name=name, attributes=attributes_block, methods=methods_block)
+
+
+def _raise(error: OSError):
+    """
+    Raise errors of os.walk instead of silently skipping the folder
+    :param error: OSError = error raised while listing a folder
+    :return: void
+    """
+    raise error
+
+
+def _parse_file(file: str, ownmodule: Optional[str], modules: FrozenSet[str] = frozenset()) -> Optional[
+        Tuple[str, List[str], List[Dict[str, str]], List[str], List[Tuple[str, str, str]]]]:
+    """
+    Extract the module structure of a single .py-file (module level to be usable by worker processes)
+    :param file: str = path to the .py-file
+    :param ownmodule: Optional[str] = name of the package (for preventing package.<submodule> import problems)
+    :param modules: FrozenSet[str] = names of all modules of the package (to tell them apart in "from . import x")
+    :return: Optional[Tuple[...]] = (name, imports, classes, functions, relations) or None if the file can not be parsed
+    """
+    with open(file, "r") as doc:
+        text = doc.read()
+
+    try:
+        tree = ast.parse(text, filename=file)
+    except SyntaxError:
+        return None
+
+    # check for imports
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level:
+            # relative imports always refer to a module of the own package
+            if node.module:
+                imports.append(node.module.split(".")[-1])
+            else:
+                # only submodules are dependencies, not names defined in the package's __init__
+                imports += [alias.name for alias in node.names if alias.name in modules]
+            continue
+
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module]
+        else:
+            continue
+
+        for name in names:
+            if "." in name:
+                module_parts = name.split(".")
+                if module_parts[0] == ownmodule:
+                    imports.append(module_parts[-1])
+                else:
+                    imports.append(module_parts[0])
+            else:
+                imports.append(name)
+
+    # extract all classes
+    classes, relations = _extract_classes(tree)
+
+    # extract functions
+    functions = [node.name for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+    name = os.path.splitext(os.path.basename(file))[0]
+    return name, imports, classes, functions, relations
+
+
+def _extract_classes(tree: ast.Module) -> Tuple[List[Dict[str, str]], List[Tuple[str, str, str]]]:
+    """
+    Extract class information from the syntax tree of a .py-file
+    :param tree: ast.Module = parsed content of .py-file
+    :return: List[Dict[str, str]], List[Tuple[str, str, str]]] = class_information, relationship-information
+    """
+    classes = []
+    relations = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+
+        # extract name and superclasses
+        name = node.name
+        superclasses = []
+        for base in node.bases:
+            if isinstance(base, ast.Name):
+                superclasses.append(base.id)
+            elif isinstance(base, ast.Attribute):
+                superclasses.append(base.attr)
+        for superclass in superclasses:
+            relations.append((superclass, name, "extend"))
+
+        # extract methods
+        method_names = []
+        init = None
+        for child in node.body:
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                method_names.append(child.name)
+                if child.name == "__init__":
+                    init = child
+
+        # extract attributes
+        attributes = []
+        if init is not None:
+            for child in ast.walk(init):
+                if isinstance(child, ast.Assign):
+                    targets = child.targets
+                elif isinstance(child, (ast.AnnAssign, ast.AugAssign)):
+                    targets = [child.target]
+                else:
+                    continue
+
+                for target in targets:
+                    elts = target.elts if isinstance(target, (ast.Tuple, ast.List)) else [target]
+                    for elt in elts:
+                        if isinstance(elt, ast.Attribute) and isinstance(elt.value, ast.Name) \
+                                and elt.value.id == "self" and elt.attr not in attributes:
+                            attributes.append(elt.attr)
+
+        classes.append({
+            "name": name,
+            "superclass": superclasses[0] if superclasses else None,
+            "methods": method_names,
+            "attributes": attributes
+        })
+    return classes, relations
 
 
 class Code2UML:
@@ -20,120 +178,70 @@ class Code2UML:
     Each inheritance will be indicated by a straight arrow with empty head
     """
 
-    def __init__(self, path: str, ownmodule: Optional[str] = None, ignore: List[str] = []):
+    def __init__(self, path: str, ownmodule: Optional[str] = None, ignore: Optional[Iterable[str]] = None):
         """
         Initializes the Code2UML class
         :param path: str = path to directory with .py files
         :param ownmodule: Optional[str] = name of the package (for preventing package.<submodule> import problems)
-        :param ignore: List[str] = list of files/folders to ignore
+        :param ignore: Optional[Iterable[str]] = names of files/folders to ignore
         """
         if not os.path.isdir(path):
             raise AttributeError("Path does not lead to a folder!")
         self.path = path
         self.ownmodule = ownmodule
+        ignore = frozenset(ignore or ())
 
         # detect all files
-        folders = [""]
         self.files = []
-        for path in folders:
-            files = os.listdir(f"{self.path}/{path}")
+        for root, folders, files in os.walk(self.path, onerror=_raise, followlinks=True):
+            folders[:] = [folder for folder in folders if folder not in ignore]
             for file in files:
-                if file in ignore:
-                    continue
-                if os.path.isdir(f"{self.path}/{path}{file}"):
-                    folders.append(f"{path}{file}/")
-                elif file[-3:] == ".py" and not ("__init__" in file):
-                    self.files.append(f"{self.path}/{path}{file}")
+                if file.endswith(".py") and "__init__" not in file and file not in ignore:
+                    self.files.append(os.path.join(root, file))
 
         # create structure fore each file
         self.modules = []
-        for file in self.files:
-            print(f"File: {file} ", end="")
-
-            with open(file, "r") as doc:
-                text = "".join(doc.readlines())
-
-            # check for imports
-            imports_ = re.findall(IMPORTPATTERN1, text)
-            imports_ += re.findall(IMPORTPATTERN2, text)
-            imports = []
-            for name in imports_:
-                if "." in name:
-                    module_parts = name.split(".")
-                    if module_parts[0] == self.ownmodule:
-                        imports.append(module_parts[-1])
-                    else:
-                        imports.append(module_parts[0])
-                else:
-                    imports.append(name)
-
-            # extract all classes
-            classes, relations = self._extract_classes(text)
-
-            # extract functions
-            functions = re.findall(FUNCPATTERN, text)
-
-            name = file.split("/")[-1].split(".")[0]
-            self.modules.append((name, imports, classes, functions, relations))
-            print("done")
-
-    def _extract_classes(self, text: str, separator: str = "    ") -> Tuple[
-        List[Dict[str: str]], List[Tuple[str, str, str]]]:
-        """
-        Protected! Extract class information from .py-file
-        :param text: str = content of .py-file
-        :param separator: str = separator used for indentation in the .py-file
-        :return: List[Dict[str: str]], List[Tuple[str, str, str]]] = class_information, relationship-information
-        """
-        classes = []
-        relations = []
-        classes_text = re.findall(CLASSPATTERN, text)
-        for class_text in classes_text:
-            # extract name and superclass
-            headline = class_text.split("\n")[0]
-            name = re.findall(r"^class (\w*)(?:|\()", headline)[0]
-            superclass = re.findall(r"^class \w*\((\w*)\):", headline)
-            if len(superclass) == 0:
-                superclass = None
-            else:
-                superclass = superclass[0]
-                relations.append((superclass, name, "extend"))
-
-            # extract methods
-            class_text = class_text.replace(f"\n{separator}", "\n")
-            methods = re.findall(METHODPATTERN, class_text)
-            method_names = [re.findall(r"^def (\w*)(?:|\()", method)[0] for method in methods]
-
-            # extract attributes
-            try:
-                init_index = method_names.index("__init__")
-                attributes = re.findall(r"self.(\w*) =", methods[init_index])
-
-            except ValueError:
-                attributes = []
-
-            classes.append({
-                "name": name,
-                "superclass": superclass,
-                "methods": method_names,
-                "attributes": attributes
-            })
-        return classes, relations
+        modules = frozenset(os.path.splitext(os.path.basename(file))[0] for file in self.files)
+        parse = partial(_parse_file, ownmodule=self.ownmodule, modules=modules)
+        if len(self.files) < _PARALLEL_MIN_FILES:
+            # starting worker processes costs more than parsing a few files
+            results = list(map(parse, self.files))
+        else:
+            with ProcessPoolExecutor(max_workers=min(len(self.files), os.cpu_count() or 1)) as executor:
+                results = list(executor.map(parse, self.files))
+
+        for file, module in zip(self.files, results):
+            if module is None:
+                print(f"File: {file} skipped (syntax error)")
+                continue
+            self.modules.append(module)
+            print(f"File: {file} done")
 
     def graphviz(self) -> str:
         """
         Generates .dot representation of the UML structure
         :return: str = .dot representation of the UML structure
         """
-        graph = "digraph UmlDiagram {\n  node[shape=record, sytle=filled, fillcolor=gray95]\n"
-        graph += """  nodesep="0.5"\n  ranksep="5.0"\n  compound=true\n"""
+        graph = []
+        self._graphviz_stream(graph.append)
+        return "".join(graph)
+
+    def _graphviz_stream(self, write: Callable[[str], object]):
+        """
+        Protected! Generates .dot representation of the UML structure piece by piece
+        :param write: Callable[[str], object] = called with each consecutive piece of the .dot representation
+        :return: void
+        """
+        write("digraph UmlDiagram {\n  node[shape=record, sytle=filled, fillcolor=gray95]\n")
+        write("""  nodesep="0.5"\n  ranksep="5.0"\n  compound=true\n""")
         clusters = {}
         for i, module in enumerate(self.modules):  # (name, imports, classes, functions, relations)
-            subgraph = f"  subgraph cluster{i}{{\n    label = <Module: <B>{module[0]}</B>>\n    labeljust=l\n"
+            write(f"\n  subgraph cluster{i}{{\n    label = <Module: <B>{module[0]}</B>>\n    labeljust=l\n")
 
             # add classes
             for c in module[2]:
-                subgraph += "  " + self._graphviz_class(c)
+                write("  ")
+                write(_graphviz_class(c["name"], c["attributes"], c["methods"]))
 
             if module[2]:
                 # this is the default one. It will be overwritten if a function exists but we dont care
@@ -141,76 +249,41 @@ class Code2UML:
 
             # add functions
             if module[3]:
-                subgraph += "  " + self._graphviz_functions(module[0], module[3])
+                write("  ")
+                write(self._graphviz_functions(module[0], module[3]))
                 clusters[module[0]] = (f"{module[0]}Functions", i)
 
-            subgraph += "  }"
-            graph += "\n" + subgraph + "\n\n"
+            write("  }\n\n")
 
         # relations are used at last
-        external = []
+        external = set()
         for module in self.modules:
-            # add import relations
-            for dependency in module[1]:
+            # add import relations (modules without classes or functions have no node to point to)
+            if module[0] in clusters:
                 end, end_i = clusters[module[0]]
-                if dependency in clusters:
-                    start, start_i = clusters[dependency]
+                for dependency in module[1]:
+                    if dependency in clusters:
+                        start, start_i = clusters[dependency]
 
-                    # xlabel="dependency"
-                    graph += f"""  {start} -> {end}[arrowhead=vee style=dashed """ + \
-                             f"""ltail = cluster{start_i} lhead = cluster{end_i} tailport=s]\n"""
-                else:
-                    graph += f"""  {dependency}[shape="folder"]"""
-                    external.append(dependency)
-                    # xlabel="dependency"
-                    graph += f"""  {dependency} -> {end}[arrowhead=vee style=dashed  """ + \
-                             f"""lhead = cluster{end_i} tailport=s]\n"""
+                        # xlabel="dependency"
+                        write(f"""  {start} -> {end}[arrowhead=vee style=dashed """
+                              f"""ltail = cluster{start_i} lhead = cluster{end_i} tailport=s]\n""")
+                    else:
+                        if dependency not in external:
+                            write(f"""  {dependency}[shape="folder"]""")
+                            external.add(dependency)
+                        # xlabel="dependency"
+                        write(f"""  {dependency} -> {end}[arrowhead=vee style=dashed  """
+                              f"""lhead = cluster{end_i} tailport=s]\n""")
 
             # add relations between classes
-            for start, end, kind in list(set(module[4])):
+            for start, end, kind in {*module[4]}:
                 # xlabel="extends"
-                graph += f"""  {start}Class -> {end}Class[dir=back arrowtail=empty headport=n, tailport=s]\n"""
+                write(f"""  {start}Class -> {end}Class[dir=back arrowtail=empty headport=n, tailport=s]\n""")
 
         # set external packages to same rank
-        graph += f"""{{rank = same; {"; ".join([str(n) for n in list(set(external))])}}}\n\n"""
-        graph += "}"
-        return graph
-
-    def _graphviz_class(self, c: Dict[str, str]) -> str:
-        """
-        Generates a .dot representation for a single class
-        :param c: Dict[str, str] = {"name", "attributes", "methods"}
-        :return: .dot representation for class c
-        """
-        string = f"""{c['name']}Class [\n"""
-        string += """  shape=plain\n  label=<<table border="0" cellborder="1" cellspacing="0" cellpadding="4">\n"""
-
-        # for name
-        string += f"""    <tr> <td> <b>{c['name']}</b> </td> </tr>\n"""
-
-        # for attributes
-        if c["attributes"]:
-            string += "    <tr> <td>\n"
-            string += """      <table border="0" cellborder="0" cellspacing="0" >\n"""
-            string += """        <tr> <td align="left" >+ property</td> </tr>\n"""
-            for attri in c["attributes"]:
-                string += f"""        <tr> <td port="ss1" align="left" >- {attri}</td> </tr>\n"""
-            string += "      </table>\n"
-            string += """    </td> </tr>\n"""
-
-        # for methods
-        if c["methods"]:
-            string += "    <tr> <td>\n"
-            string += """      <table border="0" cellborder="0" cellspacing="0" >\n"""
-            string += """        <tr> <td align="left" >+ method</td> </tr>\n"""
-            for method in c["methods"]:
-                string += f"""        <tr> <td port="ss1" align="left" >- {method}</td> </tr>\n"""
-            string += "      </table>\n"
-            string += """    </td> </tr>\n"""
-
-        # close table
-        string += "  </table>>]\n\n"
-        return string
+        write(f"""{{rank = same; {"; ".join(external)}}}\n\n""")
+        write("}")
 
     def _graphviz_functions(self, name: str, fs: List[str]) -> str:
         """
@@ -219,16 +292,15 @@ class Code2UML:
         :param fs: List[str] = list of function names
         :return: .dot representation of all functions in module
         """
-        string = f"""{name}Functions [\n"""
-        string += """    shape="folder"\n """
-        string += """    label= <<table border="0" cellborder="1" cellspacing="0" cellpadding="4">\n"""
-
-        string += """        <tr> <td align="left" >+ functions</td> </tr>\n"""
+        parts = [f"""{name}Functions [\n""",
+                 """    shape="folder"\n """,
+                 """    label= <<table border="0" cellborder="1" cellspacing="0" cellpadding="4">\n""",
+                 """        <tr> <td align="left" >+ functions</td> </tr>\n"""]
         for f in fs:
-            string += f"""        <tr> <td port="ss1" align="left" >- {f}</td> </tr>\n"""
+            parts.append(_ROW_TEMPLATE.format(f))
 
-        string += "  </table>>]\n\n"
-        return string
+        parts.append("  </table>>]\n\n")
+        return "".join(parts)
 
     def export_dot(self, path: str):
         """
@@ -236,8 +308,8 @@ class Code2UML:
         :param path: str = path where the file should be saved
         :return: void
         """
-        with open(f"{path}.dot", "w") as doc:
-            doc.write(self.graphviz())
+        with open(f"{path}.dot", "w", buffering=1 << 20) as doc:
+            self._graphviz_stream(doc.write)
 
 
 if __name__ == "__main__":